@@ -27,26 +27,52 @@ MIDI_NOTEON     = 0x90 #lower bytes must be ignored
 MIDI_NOTEOFF    = 0x80 #lower bytes must be ignored
 MIDI_AFTERTOUCH = 0xA0 #lower bytes must be ignored
 
+#status byte classification flags, see classify()
+STATUS_NOTE_ON    = 0x1
+STATUS_NOTE_OFF   = 0x2
+STATUS_AFTERTOUCH = 0x4
+STATUS_NOTE       = STATUS_NOTE_ON | STATUS_NOTE_OFF | STATUS_AFTERTOUCH
+
+#status byte lookup tables: status byte --> classification flags or whether it matches the respective MIDI message type
+_STATUS = bytes((STATUS_NOTE_ON if (b & 0xf0) == MIDI_NOTEON else 0) |
+                (STATUS_NOTE_OFF if (b & 0xf0) == MIDI_NOTEOFF else 0) |
+                (STATUS_AFTERTOUCH if (b & 0xf0) == MIDI_AFTERTOUCH else 0) for b in range(256))
+_IS_NOTE_ON = tuple(bool(f & STATUS_NOTE_ON) for f in _STATUS)
+_IS_NOTE_OFF = tuple(bool(f & STATUS_NOTE_OFF) for f in _STATUS)
+_IS_NOTE_AFTERTOUCH = tuple(bool(f & STATUS_AFTERTOUCH) for f in _STATUS)
+_IS_NOTE_OFF_OR_AFTERTOUCH = tuple(bool(f & (STATUS_NOTE_OFF | STATUS_AFTERTOUCH)) for f in _STATUS)
+_IS_NOTE = tuple(bool(f & STATUS_NOTE) for f in _STATUS)
+
+def classify(msg):
+    '''
+    Classify the given MIDI message by its status byte only, i.e. a note on message with 0 velocity
+    is classified as STATUS_NOTE_ON. Use this to avoid multiple is_note_* calls per message.
+    :param msg: MIDI message.
+    :return:    STATUS_* flags of the message (0 = no note message).
+    '''
+    return _STATUS[msg[0]]
+
 def is_note_on(msg, strict=False):
     if strict:
-        return ((msg[0] & 0xf0) ^ MIDI_NOTEON) == 0
+        return _IS_NOTE_ON[msg[0]]
     #according to the MIDI standard, note on with 0 velocity is a note off
-    return is_note_on(msg, strict=True) and msg[2] > 0
+    return _IS_NOTE_ON[msg[0]] and msg[2] > 0
 
 def is_note_off(msg, strict=False):
     if strict:
-        return ((msg[0] & 0xf0) ^ MIDI_NOTEOFF) == 0
+        return _IS_NOTE_OFF[msg[0]]
     #according to the MIDI standard, note on with 0 velocity is a note off
-    return is_note_off(msg, strict=True) or (is_note_on(msg, strict=True) and msg[2] == 0)
+    return _IS_NOTE_OFF[msg[0]] or (_IS_NOTE_ON[msg[0]] and msg[2] == 0)
 
 def is_note_aftertouch(msg):
-    return ((msg[0] & 0xf0) ^ MIDI_AFTERTOUCH) == 0
+    return _IS_NOTE_AFTERTOUCH[msg[0]]
 
 def is_note_mod(msg):
-    return is_note_off(msg) or is_note_aftertouch(msg)
+    return _IS_NOTE_OFF_OR_AFTERTOUCH[msg[0]] or (_IS_NOTE_ON[msg[0]] and msg[2] == 0)
 
 def is_note(msg):
-    return is_note_on(msg) or is_note_mod(msg)
+    #note on messages with or without velocity are notes either way
+    return _IS_NOTE[msg[0]]
 
 class XtalkPluginException(Exception):
     ''' Base class for plugin exceptions. '''
@@ -57,6 +83,8 @@ class XtalkPluginAbortException(XtalkPluginException):
 class _XtalkPlugin(ABC):
     ''' Internal base class. Not meant to be used by users. '''
 
+    __slots__ = ('_debug', 'config')
+
     def __init__(self, config=None, debug=False):
         ''' Constructor.
         :param config: A dict with configuration options supplied by the user.
@@ -67,13 +95,17 @@ class _XtalkPlugin(ABC):
         if not self.config:
             self.config = {}
 
-    def debug(self, msg):
+    def debug(self, msg, *args):
         ''' Helper method to print debug output in a standard format.
-        :param msg: Debug message string.
+        :param msg: Debug message string. May contain %-style placeholders for the args.
+        :param args: Arguments for the placeholders. They are only formatted in debug mode, i.e. callers
+                     on hot code paths should prefer passing arguments over building f-strings.
         '''
         if self._debug:
-            now = time.time_ns()/1000000 #ms since epoch
+            now = time.monotonic_ns()/1000000 #ms on the monotonic clock (comparable between xtalk and its plugins)
             cls_name = type(self).__name__
+            if args:
+                msg = msg % args
             print(f'DEBUG ({now}): {cls_name}: {msg}', flush=True)
 
 class XtalkPlugin(_XtalkPlugin):
@@ -82,8 +114,13 @@ class XtalkPlugin(_XtalkPlugin):
 
     In addition they must use a class name equal to `XtalkPlugin_[plugin name]` to be scheduled
     by xtalk.
+
+    Plugins may define `__slots__` for their instance attributes to save memory and speed up
+    attribute access.
     '''
 
+    __slots__ = ()
+
     @abstractmethod
     async def process(self, msg):
         '''
@@ -94,10 +131,31 @@ class XtalkPlugin(_XtalkPlugin):
         Blocking or delaying this function will block or delay the MIDI message
         pipeline, i.e. it should return as fast as possible.
 
+        Plugins which do not need to await anything should implement this
+        function as regular generator (`def` instead of `async def`) as that
+        avoids the async generator overhead for every MIDI message.
+
         Messages can be modified, added or filtered.
 
         Unhandled AbortExceptions will abort xtalk. Other exceptions are logged only.
 
-        :param msg: 3 byte MIDI message.
+        :param msg: 3 byte MIDI message as list of ints, as delivered by rtmidi. It may be modified in place.
         :return:    Iterable of MIDI messages that should be passed to the next plugin.
         '''
+
+    def process_many(self, msgs):
+        '''
+        Process the given list of MIDI messages in one go.
+        xtalk uses this function instead of `process` for plugins implementing `process` as
+        regular generator. The default implementation calls `process` for each message.
+
+        Plugins may override it to avoid the per-message call overhead. The same rules as
+        for `process` apply.
+
+        :param msgs: List of MIDI messages. It may be modified in place.
+        :return:     List of MIDI messages that should be passed to the next plugin.
+        '''
+        out = []
+        for msg in msgs:
+            out.extend(self.process(msg))
+        return out
@@ -32,33 +32,48 @@ class XtalkPlugin_amplify(XtalkPlugin):
     # map: MIDI note --> dict of "multiply" (percent) and "add" factors; the new velocity will be: v_new = v_old * multiply + add
     AMPLIFY = { }
 
+    __slots__ = ('_amp',)
+
     def __init__(self, config=None, debug=False):
         super().__init__(config=config, debug=debug)
 
+        amplify = self.AMPLIFY
         if config:
-            self.AMPLIFY = dict(config.get('amplify', self.AMPLIFY))
+            amplify = config.get('amplify', amplify)
 
-        for val in self.AMPLIFY.values():
+        #velocity lookup tables: MIDI note --> old velocity --> new velocity (None = no amplification)
+        self._amp = [None]*128
+        for note, val in amplify.items():
             try:
                 int(val.get('multiply',1))
                 int(val.get('add',0))
-            except (KeyError, ValueError, NameError) as e:
+            except (KeyError, ValueError, NameError, AttributeError) as e:
                 raise ValueError(f'The amplification values must be specified as dict, but this looks different: {val}') from e
 
-    async def process(self, msg):
-        if is_note_on(msg):
-            note = str(msg[1])
-            velocity = msg[2]
+            try:
+                note = int(note)
+                if not 0 <= note <= 127:
+                    raise ValueError(note)
+            except ValueError as e:
+                raise ValueError(f'Invalid MIDI note: {note}') from e
+
+            if val:
+                mul = val.get('multiply', 100)/100
+                add = val.get('add', 0)
+                self._amp[note] = bytes(max(0, min(127, int(velocity * mul + add))) for velocity in range(128))
+
+    def process(self, msg):
+        yield from self.process_many([msg])
+
+    def process_many(self, msgs):
+        amp = self._amp
+        for msg in msgs:
+            if is_note_on(msg):
+                lut = amp[msg[1]]
 
-            if self.AMPLIFY.get(note):
-                mul = self.AMPLIFY[note].get('multiply', 100)/100
-                add = self.AMPLIFY[note].get('add', 0)
-                nvelo = int(velocity * mul + add)
-                if nvelo < 0:
-                    nvelo = 0
-                elif nvelo > 127:
-                    nvelo = 127
-                self.debug(f'{msg}: mul: {mul}, add: {add} --> new velocity: {nvelo}')
-                msg[2] = nvelo
+                if lut is not None:
+                    nvelo = lut[msg[2]]
+                    self.debug('%s --> new velocity: %s', msg, nvelo)
+                    msg[2] = nvelo
 
-        yield msg
+        return msgs
@@ -66,37 +66,56 @@ class XtalkPlugin_choke(XtalkPlugin):
     # time in ms during which to allow chokes
     TIMEOUT = 3000
 
+    __slots__ = ('last', 'last_time', 'last_choked', 'choke_cnt', 'notes', '_params', '_timeout_ns')
+
     def __init__(self, config=None, debug=False):
         super().__init__(config=config, debug=debug)
 
         self.last = None #last cymbal message, if any was seen lately
-        self.last_time = None #timestamp of the last cymbal message
+        self.last_time = None #monotonic timestamp (ns) of the last cymbal message
         self.last_choked = False #whether the last cymbal message was choked or not
         self.choke_cnt = 0 #number of chokes recently seen
-        self.notes = set() #cymbal notes for quick access
-
-        if config:
-            self.CHOKE = dict(config.get('choke', self.CHOKE))
-            self.CHOKE_MIN = dict(config.get('choke_min', self.CHOKE_MIN))
-            self.CHOKE_MAX = dict(config.get('choke_max', self.CHOKE_MAX))
-            self.CHOKE_CNT = dict(config.get('choke_cnt', self.CHOKE_CNT))
-            self.CYMBAL_MIN = dict(config.get('cymbal_min', self.CYMBAL_MIN))
-            self.TIMEOUT = int(config.get('timeout', self.TIMEOUT))
-            assertHasDefault(self.CHOKE_MIN)
-            assertHasDefault(self.CHOKE_MAX)
-            assertHasDefault(self.CHOKE_CNT)
-            assertHasDefault(self.CYMBAL_MIN)
-
-        for val in self.CHOKE.values():
-            self.notes = self.notes.union(set(val))
+
+        #the configuration is only needed to build the lookup tables below
+        if not config:
+            config = {}
+        choke = config.get('choke', self.CHOKE)
+        choke_min = config.get('choke_min', self.CHOKE_MIN)
+        choke_max = config.get('choke_max', self.CHOKE_MAX)
+        choke_cnt = config.get('choke_cnt', self.CHOKE_CNT)
+        cymbal_min = config.get('cymbal_min', self.CYMBAL_MIN)
+        timeout = int(config.get('timeout', self.TIMEOUT))
+        assertHasDefault(choke_min)
+        assertHasDefault(choke_max)
+        assertHasDefault(choke_cnt)
+        assertHasDefault(cymbal_min)
+
+        self._timeout_ns = timeout * 1000000
+
+        self.notes = frozenset().union(*choke.values()) #cymbal notes for quick access
+
+        #fallback values for notes without explicit configuration
+        choke_min_default = int(choke_min["default"])
+        choke_max_default = int(choke_max["default"])
+        cymbal_min_default = int(cymbal_min["default"])
+        choke_cnt_default = int(choke_cnt["default"])
+
+        #per-note parameters for quick access: MIDI note --> (choke_min, choke_max, cymbal_min, choke_cnt, choke targets)
+        self._params = [None]*128
+        for note in range(128):
+            note_str = str(note)
+            self._params[note] = (int(choke_min.get(note_str, choke_min_default)),
+                                  int(choke_max.get(note_str, choke_max_default)),
+                                  int(cymbal_min.get(note_str, cymbal_min_default)),
+                                  int(choke_cnt.get(note_str, choke_cnt_default)),
+                                  frozenset(choke.get(note_str, ())))
 
     def _create_choke(self, msg):
-        channel = msg[0] & 0x0F
+        status = MIDI_AFTERTOUCH | (msg[0] & 0x0F)
         note = msg[1]
 
         # aftertouch with full pressure, then go to zero
-        yield [ MIDI_AFTERTOUCH | channel, note, 127 ]
-        yield [ MIDI_AFTERTOUCH | channel, note, 0 ]
+        return ([ status, note, 127 ], [ status, note, 0 ])
 
     def clear(self):
         self.last = None
@@ -104,44 +123,43 @@ class XtalkPlugin_choke(XtalkPlugin):
         self.choke_cnt = 0
         self.last_choked = False
 
-    async def process(self, msg):
-        if is_note_on(msg):
-            note = msg[1]
-            note_str = str(note)
-            velocity = msg[2]
-            now = time.time_ns()/1000000 #ms since epoch
-
-            choke_min = self.CHOKE_MIN.get(note_str, self.CHOKE_MIN["default"])
-            choke_max = self.CHOKE_MAX.get(note_str, self.CHOKE_MAX["default"])
-            cymbal_min = self.CYMBAL_MIN.get(note_str, self.CYMBAL_MIN["default"])
-            choke_cnt = self.CHOKE_CNT.get(note_str, self.CHOKE_CNT["default"])
-
-            if self.last_time and (self.last_time - now) > self.TIMEOUT:
-                self.debug('choke timeout reached')
-                self.clear()
-
-            # check for choke note
-            if self.last and choke_max >= velocity >= choke_min and self.last[1] in self.CHOKE.get(str(note), {}):
-                self.debug(f'choke note: {msg}, choke_min: {choke_min}, choke_max: {choke_max}, choke_cnt: {choke_cnt}, cymbal_min: {cymbal_min}')
-                self.choke_cnt += 1
-                if self.choke_cnt >= choke_cnt:
-                    # make sure that chokes are only emitted once (otherwise drumgizmo will go to aftertouch 127 for a short time on a second choke note)
-                    if not self.last_choked:
-                        for choke in self._create_choke(self.last):
-                            yield choke
-                        self.last_choked = True
-
-                #suppress the choke note (multiple may occur)
-                return
-
-            # check for regular cymbal hit
-            if note in self.notes:
-                self.clear()
-
-                if velocity >= cymbal_min:
-                    self.debug(f'regular cymbal hit: {msg}')
-                    self.last = msg
-                    self.last_time = now
-                    self.last_choked = False
+    def process(self, msg):
+        # only note on messages are of interest
+        if not is_note_on(msg):
+            yield msg
+            return
+
+        note = msg[1]
+        velocity = msg[2]
+
+        choke_min, choke_max, cymbal_min, choke_cnt, targets = self._params[note]
+
+        # the clock is only read if a cymbal hit is pending
+        if self.last_time is not None and (time.monotonic_ns() - self.last_time) > self._timeout_ns:
+            self.debug('choke timeout reached')
+            self.clear()
+
+        # check for choke note
+        if self.last and choke_max >= velocity >= choke_min and self.last[1] in targets:
+            self.debug('choke note: %s, choke_min: %s, choke_max: %s, choke_cnt: %s, cymbal_min: %s', msg, choke_min, choke_max, choke_cnt, cymbal_min)
+            self.choke_cnt += 1
+            if self.choke_cnt >= choke_cnt:
+                # make sure that chokes are only emitted once (otherwise drumgizmo will go to aftertouch 127 for a short time on a second choke note)
+                if not self.last_choked:
+                    yield from self._create_choke(self.last)
+                    self.last_choked = True
+
+            #suppress the choke note (multiple may occur)
+            return
+
+        # check for regular cymbal hit
+        if note in self.notes:
+            self.clear()
+
+            if velocity >= cymbal_min:
+                self.debug('regular cymbal hit: %s', msg)
+                self.last = msg
+                self.last_time = time.monotonic_ns()
+                self.last_choked = False
 
         yield msg
@@ -27,16 +27,23 @@ class XtalkPlugin_example(XtalkPlugin):
     Some edrumulus hotfixes serving as an example.
     '''
 
-    async def process(self, msg):
-        if is_note_on(msg):
+    __slots__ = ()
 
-            # the hihat (note 22) always comes in at maximum velocity (127) --> reduce it
-            if msg[1] == 22 and msg[2] == 127:
-                msg[2] = 50
+    def process(self, msg):
+        yield from self.process_many([msg])
 
-            # MPS 750x ride heuristics: if the ride bell is hit, it triggers a ride edge (59) note with low velocity
-            # -->switch that to ride bell (53)
-            if msg[1] == 59 and msg[2] <= 80:
-                msg[1] = 53
+    def process_many(self, msgs):
+        # optional: xtalk passes all messages of a pipeline iteration at once
+        for msg in msgs:
+            if is_note_on(msg):
 
-        yield msg
+                # the hihat (note 22) always comes in at maximum velocity (127) --> reduce it
+                if msg[1] == 22 and msg[2] == 127:
+                    msg[2] = 50
+
+                # MPS 750x ride heuristics: if the ride bell is hit, it triggers a ride edge (59) note with low velocity
+                # -->switch that to ride bell (53)
+                if msg[1] == 59 and msg[2] <= 80:
+                    msg[1] = 53
+
+        return msgs
@@ -19,15 +19,17 @@
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 #
 
-import asyncio
+import os
 import subprocess
 import sys
+import threading
 import time
 import traceback
 
 from plugins import XtalkPlugin
-from plugins import is_note
-from plugins import is_note_on
+from plugins import classify
+from plugins import STATUS_NOTE
+from plugins import STATUS_NOTE_ON
 
 class XtalkPlugin_exec(XtalkPlugin):
     '''
@@ -48,71 +50,93 @@ class XtalkPlugin_exec(XtalkPlugin):
     # whether all notes should trigger program execution (False = MIDI note on messages only)
     ALL_NOTES = False
 
+    __slots__ = ('suppression_cache', '_devnull', '_exec', '_pass', '_suppress_ns', '_all_notes')
+
     def __init__(self, config=None, debug=False):
         super().__init__(config=config, debug=debug)
 
-        self.suppression_cache = {}
-        self.background_tasks = set()
+        self.suppression_cache = [None]*128 #MIDI note --> monotonic timestamp (ns) of the last execution
+        self._devnull = os.open(os.devnull, os.O_RDONLY) #stdin for all commands, opened once
 
-        if config:
-            self.EXEC = dict(config.get('exec', self.EXEC))
-            self.PASS = bool(config.get('pass', self.PASS))
-            self.SUPPRESS = int(config.get('suppress', self.SUPPRESS))
-            self.ALL_NOTES = bool(config.get('all_notes', self.ALL_NOTES))
+        commands = self.config.get('exec', self.EXEC)
+        self._pass = bool(self.config.get('pass', self.PASS))
+        self._suppress_ns = int(self.config.get('suppress', self.SUPPRESS)) * 1000000
+        self._all_notes = bool(self.config.get('all_notes', self.ALL_NOTES))
 
-        for val in self.EXEC.values():
+        #commands for quick access: MIDI note --> list of command dicts (None = nothing to execute)
+        self._exec = [None]*128
+        for note, val in commands.items():
             try:
                 for d in val:
                     _testing = d['command'][0]
             except (TypeError, KeyError, ValueError) as e:
                 raise ValueError(f'The commands must be specified as in the example, but this looks different: {val}') from e
 
-    async def execute_coro(self, command):
+            try:
+                note = int(note)
+                if not 0 <= note <= 127:
+                    raise ValueError(note)
+            except ValueError as e:
+                raise ValueError(f'Invalid MIDI note: {note}') from e
+
+            if val:
+                self._exec[note] = val
+
+    def __del__(self):
+        try:
+            os.close(self._devnull)
+        except (AttributeError, OSError):
+            pass
+
+    def run(self, command):
+        ''' Run the given command and wait for it to exit. Blocks, i.e. must not be called from the event loop. '''
         try:
-            proc = await asyncio.create_subprocess_exec(*command, stdin=subprocess.DEVNULL, stdout=sys.stdout, stderr=sys.stderr)
-            ret = await proc.wait()
+            proc = subprocess.Popen(command, stdin=self._devnull, stdout=sys.stdout, stderr=sys.stderr)
+            ret = proc.wait()
             if ret != 0:
                 print(f'The command {command} returned a non-zero exit code {ret}.', file=sys.stderr)
         except Exception:
             traceback.print_exc()
 
     def execute(self, command):
-        task = asyncio.create_task(self.execute_coro(command))
-        #without this reference, tasks may be garbage collected, even if still running
-        self.background_tasks.add(task)
-        task.add_done_callback(self.background_tasks.discard)
+        #fork/exec may take milliseconds --> keep it off the MIDI event loop
+        #daemon threads don't keep xtalk from exiting while commands are still running
+        threading.Thread(target=self.run, args=(command,), name='xtalk-exec', daemon=True).start()
 
-    async def process(self, msg):
+    def process(self, msg):
         pass_msg = True
 
-        if is_note(msg):
+        status = classify(msg)
+        if status & STATUS_NOTE:
             note = msg[1]
             velocity = 0
-            if is_note_on(msg):
+            #according to the MIDI standard, note on with 0 velocity is a note off
+            is_on = status & STATUS_NOTE_ON and msg[2] > 0
+            if is_on:
                 velocity = msg[2]
 
-            to_exec = self.EXEC.get(str(note))
+            to_exec = self._exec[note]
             if to_exec:
-                if self.ALL_NOTES or is_note_on(msg):
-                    last = self.suppression_cache.get(note)
-                    now = time.time_ns()/1000000 #ms since epoch
+                if self._all_notes or is_on:
+                    last = self.suppression_cache[note]
+                    now = time.monotonic_ns()
 
-                    if last and ( now - last <= self.SUPPRESS ):
-                        self.debug(f'execution of {to_exec} suppressed: {msg}')
+                    if last is not None and ( now - last <= self._suppress_ns ):
+                        self.debug('execution of %s suppressed: %s', to_exec, msg)
                     else:
                         self.suppression_cache[note] = now
                         for ex in to_exec:
                             min_velocity = ex.get('min_velocity', 0)
                             if velocity >= min_velocity:
                                 cmd = ex['command']
-                                self.debug(f'executing: {cmd}')
+                                self.debug('executing: %s', cmd)
                                 self.execute(cmd)
                                 break
 
-                #NOTE: we intentionally also block note off or other related messages here with self.PASS = False - even if nothing was executed
-                pass_msg = self.PASS
+                #NOTE: we intentionally also block note off or other related messages here with pass = false - even if nothing was executed
+                pass_msg = self._pass
 
         if pass_msg:
             yield msg
         else:
-            self.debug(f'suppressed: {msg}')
+            self.debug('suppressed: %s', msg)
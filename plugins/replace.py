@@ -23,8 +23,15 @@ import asyncio
 import re
 
 from plugins import XtalkPlugin
-from plugins import is_note
-from plugins import is_note_on
+from plugins import classify
+from plugins import STATUS_NOTE
+from plugins import STATUS_NOTE_ON
+
+#TCP API command syntax (matched against the raw bytes)
+CMD_PATTERN = re.compile(rb'^(enable|disable|toggle|unique) (.*)$')
+
+#maximum TCP API command line length in bytes
+CMD_MAX_LEN = 256
 
 class XtalkPlugin_replace(XtalkPlugin):
     '''
@@ -55,14 +62,16 @@ class XtalkPlugin_replace(XtalkPlugin):
     See the supplied example config.json for all available configuration options.
     '''
 
+    __slots__ = ('replacements', 'triggers', 'cmd_index', 'server', 'server_port', 'server_address', '_replace', '_by_id', '_enable_notes', '_disable_notes', '_passthrough')
+
     def __init__(self, config=None, debug=False):
         super().__init__(config=config, debug=debug)
 
-        #currently active replacements map: from MIDI note --> to MIDI note
-        self.replacements = {}
+        #currently active replacements: from MIDI note --> to MIDI note (None = no replacement)
+        self.replacements = [None]*128
 
-        #map of triggers: MIDI note --> set of enable or disable triggers (configuration indices as references)
-        self.triggers = {}
+        #triggers: MIDI note --> tuple of enable or disable triggers (configuration indices as references)
+        self.triggers = [()]*128
 
         #index for the next|previous commands
         self.cmd_index = 0
@@ -70,6 +79,19 @@ class XtalkPlugin_replace(XtalkPlugin):
         #whether or not to spawn a TCP server by default
         self.server = False
 
+        #replacement configuration items
+        self._replace = list(self.config.get("replace", []))
+
+        #map: str id --> tuple of replacement configuration items with that id (ids may be used multiple times)
+        by_id = {}
+        for replacement in self._replace:
+            by_id.setdefault(str(replacement.get("id")), []).append(replacement)
+        self._by_id = {id_str: tuple(repls) for id_str, repls in by_id.items()}
+
+        #enable and disable trigger notes per replacement configuration item (same indices as self._replace)
+        self._enable_notes = [frozenset(replacement.get("enable", ())) for replacement in self._replace]
+        self._disable_notes = [frozenset(replacement.get("disable", ())) for replacement in self._replace]
+
         if config:
             #init server vars
             self.server = bool(config.get("server", False))
@@ -77,16 +99,27 @@ class XtalkPlugin_replace(XtalkPlugin):
             self.server_address = config.get("address", "localhost")
 
             #init self.replacements & self.triggers
-            for index, replacement in enumerate(config.get("replace", [])):
+            triggers = {}
+            for index, replacement in enumerate(self._replace):
+                trigger_notes = self._enable_notes[index] | self._disable_notes[index]
+                for note in trigger_notes.union(replacement.get("from", ())):
+                    try:
+                        if not 0 <= note <= 127:
+                            raise ValueError(note)
+                    except (TypeError, ValueError) as e:
+                        raise ValueError(f'Invalid MIDI note: {note}') from e
+
                 if self.is_enabled(replacement):
                     self.enable(replacement, force=True)
-                triggers = set(replacement.get("enable", set())).union(set(replacement.get("disable", set())))
-                for trigger in triggers:
-                    self.triggers[trigger] = self.triggers.get(trigger) or set()
-                    self.triggers[trigger].add(index)
+                for trigger in trigger_notes:
+                    triggers.setdefault(trigger, []).append(index)
+            for trigger, indices in triggers.items():
+                self.triggers[trigger] = tuple(indices)
+
+        self.update_passthrough()
 
-        self.debug(f'replacements: {self.replacements}')
-        self.debug(f'triggers: {self.triggers}')
+        self.debug('replacements: %s', {note: rto for note, rto in enumerate(self.replacements) if rto is not None})
+        self.debug('triggers: %s', {note: indices for note, indices in enumerate(self.triggers) if indices})
 
         #spawn server, if necessary
         if self.server:
@@ -94,23 +127,29 @@ class XtalkPlugin_replace(XtalkPlugin):
             loop.call_soon(asyncio.create_task, self.start_server())
 
     async def start_server(self):
-        server = await asyncio.start_server(self.handle_client, host=self.server_address, port=self.server_port)
+        #valid commands are short, i.e. there's no need to buffer more
+        server = await asyncio.start_server(self.handle_client, host=self.server_address, port=self.server_port, limit=CMD_MAX_LEN)
 
         addrs = ', '.join(str(sock.getsockname()) for sock in server.sockets)
-        self.debug(f'Started server on {addrs}.')
+        self.debug('Started server on %s.', addrs)
 
         async with server:
             await server.serve_forever()
 
     async def handle_client(self, reader, writer):
         self.debug('Client connected.')
-        pattern = re.compile('^(enable|disable|toggle|unique) (.*)$')
 
         line = True
         while line:
         #NOTE: This interface is inherently easy to attack via DoS. So do not use this in hostile environments!
             try:
-                line = await reader.readline()
+                line = await reader.readuntil(b'\n')
+            except asyncio.IncompleteReadError as e:
+                line = e.partial #EOF
+            except asyncio.LimitOverrunError:
+                self.debug('Client sent an oversized line. Disconnecting...')
+                writer.close()
+                return
             except:
                 continue
 
@@ -118,40 +157,38 @@ class XtalkPlugin_replace(XtalkPlugin):
                 self.debug('Client disconnected.')
                 return
 
-            try:
-                line = line.decode(encoding="utf-8", errors="strict")
-            except UnicodeError:
-                self.debug('Client caused an encoding error.')
-                continue
-
-            match = pattern.match(line)
+            match = CMD_PATTERN.match(line)
             if match:
                 cmd = match.group(1)
-                id_str = match.group(2)
+                try:
+                    id_str = match.group(2).decode(encoding="utf-8", errors="strict")
+                except UnicodeError:
+                    self.debug('Client caused an encoding error.')
+                    continue
 
                 repls = self.find_replacements(id_str)
                 if not repls:
-                    self.debug(f'Unexpected ID: {line}')
+                    self.debug('Unexpected ID: %s', line)
                     continue
 
-                if cmd == 'enable':
+                if cmd == b'enable':
                     for repl in repls:
                         self.enable(repl)
-                elif cmd == 'disable':
+                elif cmd == b'disable':
                     for repl in repls:
                         self.disable(repl)
-                elif cmd == 'toggle':
+                elif cmd == b'toggle':
                     for repl in repls:
                         self.toggle(repl)
-                elif cmd == 'unique':
+                elif cmd == b'unique':
                     self.disable_all()
                     for repl in repls:
                         self.enable(repl, force=True)
                 else:
-                    self.debug(f'Unexpected command: {line}')
+                    self.debug('Unexpected command: %s', line)
                     continue
             else:
-                self.debug(f'Unexpected line: {line}')
+                self.debug('Unexpected line: %s', line)
                 continue
 
     def is_enabled(self, replacement):
@@ -160,29 +197,35 @@ class XtalkPlugin_replace(XtalkPlugin):
     #enable the given replacement configuration item
     def enable(self, replacement, force=False):
         if force or not self.is_enabled(replacement):
-            rfrom = set(replacement.get("from", set()))
+            rfrom = replacement.get("from", ()) #duplicates are harmless
             rto = int(replacement.get("to"))
 
             for note in rfrom:
                 self.replacements[note] = rto
 
             replacement["enabled"] = True
-            self.debug(f'Enabled: {replacement}')
+            self.update_passthrough()
+            self.debug('Enabled: %s', replacement)
 
     #disable the given replacement configuration item
     def disable(self, replacement):
         if self.is_enabled(replacement):
-            rfrom = set(replacement.get("from", set()))
+            rfrom = replacement.get("from", ()) #duplicates are harmless
 
             for note in rfrom:
                 self.replacements[note] = None
 
             replacement["enabled"] = False
-            self.debug(f'Disabled: {replacement}')
+            self.update_passthrough()
+            self.debug('Disabled: %s', replacement)
+
+    #update whether messages can be passed through unmodified (no triggers and no active replacements)
+    def update_passthrough(self):
+        self._passthrough = not any(self.triggers) and self.replacements.count(None) == 128
 
     def disable_all(self):
         self.debug('Disabling all...')
-        for rpl in self.config.get("replace", set()):
+        for rpl in self._replace:
             self.disable(rpl)
 
     #toggle the enable status of the given replacement configuration item
@@ -192,45 +235,51 @@ class XtalkPlugin_replace(XtalkPlugin):
         else:
             self.enable(replacement)
 
-    #find matching replacements by id (supports next|previous commands)
+    #find matching replacements by id (supports next|previous commands), returns a tuple
     def find_replacements(self, id_str):
-        replacements = list(self.config.get("replace", []))
+        replacements = self._replace
 
         if not replacements:
-            return
+            return ()
 
         if id_str == "next":
             self.cmd_index = ( self.cmd_index + 1 ) % len(replacements)
-            yield replacements[self.cmd_index]
-            return
+            return (replacements[self.cmd_index],)
         if id_str == "previous":
             self.cmd_index = ( self.cmd_index - 1 ) % len(replacements)
-            yield replacements[self.cmd_index]
-            return
+            return (replacements[self.cmd_index],)
+
+        return self._by_id.get(id_str, ())
 
-        for replacement in replacements:
-            if id_str == str(replacement.get("id")):
-                yield replacement
+    def process_many(self, msgs):
+        if self._passthrough:
+            return msgs
+        return super().process_many(msgs)
 
-    async def process(self, msg):
-        if is_note(msg):
+    def process(self, msg):
+        if self._passthrough:
+            yield msg
+            return
+
+        status = classify(msg)
+        if status & STATUS_NOTE:
             note = msg[1]
 
             #process triggers
-            if is_note_on(msg):
-                for index in self.triggers.get(note, set()):
-                    replacement = self.config.get("replace", [])[index]
-                    if note in set(replacement.get("enable", set())) and note in set(replacement.get("disable", set())):
+            if status & STATUS_NOTE_ON and msg[2] > 0:
+                for index in self.triggers[note]:
+                    replacement = self._replace[index]
+                    enable = note in self._enable_notes[index]
+                    if enable and note in self._disable_notes[index]:
                         self.toggle(replacement)
-                    elif note in set(replacement.get("enable", set())):
+                    elif enable:
                         self.enable(replacement)
                     else:
                         self.disable(replacement)
 
             #process replacements
-            note_to = self.replacements.get(note) or note
-            if note_to != note:
-                self.debug(f'Replaced: {note} -> {note_to}')
-
-            msg[1] = note_to
+            note_to = self.replacements[note]
+            if note_to is not None:
+                self.debug('Replaced: %s -> %s', note, note_to)
+                msg[1] = note_to
         yield msg
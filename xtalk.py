@@ -27,54 +27,128 @@ import sys
 import time
 import os
 import json
-import copy
 import inspect
+import functools
+import math
+from collections import deque
 import importlib.util
 import rtmidi # rtmidi doc: https://spotlightkid.github.io/python-rtmidi/rtmidi.html
 from rtmidi.midiutil import list_input_ports
 from rtmidi.midiutil import list_output_ports
 from rtmidi.midiutil import open_midiport
 
+#bitset of all MIDI notes (bit i = note i)
+ALL_NOTES = (1 << 128) - 1
+
+def pack(msg):
+    ''' Pack the given 3 byte MIDI message into a single int (status << 16 | data1 << 8 | data2). '''
+    return (msg[0] << 16) | (msg[1] << 8) | msg[2]
+
 class MessageHistory():
+    ''' History of MIDI messages. The messages are stored as packed ints, see pack(). '''
+
     def __init__(self, idx):
-        self._history = {} #value = velocity/note --> list of events
+        #value = velocity/note --> events in the order they were added
+        #NOTE: Events are removed in the order they were added (after a fixed time), i.e. from the left end. deques make that O(1).
+        #NOTE: MIDI data bytes (notes and velocities) are 7 bit values.
+        self._history = [deque() for _ in range(128)]
+        self._max = [0]*128 #value = velocity/note --> maximum velocity among its events (0 = no events)
+        self._active = 0 #bitset of the values with events (bit i = value i)
+        self.epoch = 0 #incremented on every change
         self._idx = idx #index of the value in the message
-        for i in range(256):
-            self._history[i] = []
 
     def add(self, msg):
-        self._history[msg[self._idx]].append(msg)
+        val = msg[self._idx]
+        self._history[val].append(pack(msg))
+        self._active |= 1 << val
+        self.epoch += 1
+        if msg[2] > self._max[val]:
+            self._max[val] = msg[2]
 
     def remove(self, msg):
-        try:
-            self._history[msg[self._idx]].remove(msg)
-        except ValueError:
-            pass
+        ''' Remove the given message. It must be the oldest one with its value. '''
+        val = msg[self._idx]
+        history = self._history[val]
+        event = pack(msg)
+        if not history or history[0] != event:
+            return
+        history.popleft()
+        self.epoch += 1
+        if not history:
+            self._active &= ~(1 << val)
+        #the maximum only changes, if the removed event had it
+        if event & 0xff == self._max[val]:
+            self._max[val] = max((e & 0xff for e in history), default=0)
+
+    def get_similar_max_velocity(self, msg):
+        ''' Get the maximum velocity among the events with the same value as the given message (0 if there are none). '''
+        return self._max[msg[self._idx]]
+
+    def has_any(self, bits):
+        ''' Check whether any of the values in the given bitset (bit i = value i) have events. '''
+        return (self._active & bits) != 0
+
+    def get_max_velocity(self, bits):
+        ''' Get the maximum velocity among all events of the values in the given bitset (bit i = value i, 0 if there are none). '''
+        if bits == ALL_NOTES:
+            return max(self._max)
+        #only visit values with events
+        present = self._active & bits
+        ret = 0
+        while present:
+            lowest = present & -present
+            velocity = self._max[lowest.bit_length() - 1]
+            if velocity > ret:
+                ret = velocity
+            present ^= lowest
+        return ret
 
-    def pop_similar(self, msg):
-        try:
-            return self._history[msg[self._idx]].pop()
-        except IndexError:
-            return None
+    def __str__(self):
+        return f'{self._idx}: {dict(enumerate(self._history))}'
 
-    def has_similar(self, msg):
-        return len(self._history[msg[self._idx]]) > 0
+class MessageCounter():
+    ''' Counts MIDI messages per value. Use this instead of a MessageHistory, if only the number of messages matters. '''
 
-    def get_similar(self, msg):
-        yield from self._history[msg[self._idx]]
+    def __init__(self, idx):
+        self._counts = [0]*128 #value = velocity/note --> number of messages
+        #value = velocity/note --> [message, counted] entries in the order they were added
+        #NOTE: Messages consumed by pop_similar() stay here until they are removed, so that their removal doesn't decrement the count a second time.
+        self._pending = [deque() for _ in range(128)]
+        self._idx = idx #index of the value in the message
 
-    def get_all(self, values):
-        if not values:
-            return
-        for val in values:
-            yield from self._history[val]
+    def add(self, msg):
+        val = msg[self._idx]
+        self._pending[val].append([msg, True])
+        self._counts[val] += 1
+
+    def remove(self, msg):
+        val = msg[self._idx]
+        pending = self._pending[val]
+        #messages are usually removed in the order they were added
+        for i, entry in enumerate(pending):
+            if entry[0] is msg:
+                del pending[i]
+                if entry[1]:
+                    self._counts[val] -= 1
+                return
 
-    def get_all_above(self, threshold):
-        for i in range(int(threshold), 256):
-            yield from self._history[i]
+    def pop_similar(self, msg):
+        ''' Remove the last added message with the same value as the given message from the count. Returns True, if there was one. '''
+        val = msg[self._idx]
+        if self._counts[val] == 0:
+            return False
+        for entry in reversed(self._pending[val]):
+            if entry[1]:
+                entry[1] = False
+                self._counts[val] -= 1
+                return True
+        return False
+
+    def has_similar(self, msg):
+        return self._counts[msg[self._idx]] > 0
 
     def __str__(self):
-        return f'{self._idx}: {self._history}'
+        return f'{self._idx}: {dict(enumerate(self._counts))}'
 
 #global vars
 SCRIPT_DIR = os.path.dirname(os.path.realpath(__file__))
@@ -84,10 +158,14 @@ PLUGIN_CONF_FILE_DEFAULT = os.path.join(PLUGIN_DIR, 'config.json')
 PLUGINS = [] #plugins in the order to use
 ARGS = None
 POLICY = None
-QUEUE = None
+KINDS = None #status byte --> KIND_* flags as per the --dtypes argument, see message_kind()
+QUEUE = None #incoming (message, delta) tuples
+QUEUE_EVENT = None #set when messages are added to the QUEUE
 LOOP = None
 HISTORY = MessageHistory(1) #recently seen note_on messages per note (idx = 1)
-DISABLED = MessageHistory(1) #recent NOTE_OFF or similar Midi messages per note number (idx = 1)
+DISABLED = MessageCounter(1) #number of recent NOTE_OFF or similar Midi messages per note number (idx = 1)
+COALESCE = {} #status << 8 | note --> (queued aftertouch message, time.monotonic() it came in), see coalesce()
+EXPIRY = deque() #scheduled HISTORY and DISABLED cleanups: (loop time, MessageHistory, message) in the order of their expiry
 
 #import the plugin base class
 sys.path.insert(1, PLUGIN_DIR)
@@ -98,6 +176,32 @@ from plugins import is_note_on
 from plugins import is_note_off
 from plugins import is_note_aftertouch
 from plugins import is_note_mod
+from plugins import MIDI_NOTEON
+from plugins import MIDI_NOTEOFF
+
+class Policy():
+    ''' A single filter policy for a set of notes as created by FilterPolicy.add_policy(). '''
+
+    __slots__ = ('cause', 'cause_bits', 'threshold', 'minimum', 'check_disable', 'multi_disable', 'only_self', 'acceptable', 'can_block')
+
+    def __init__(self, cause, cause_bits, threshold, minimum, check_disable, multi_disable, only_self):
+        self.cause = cause
+        self.cause_bits = cause_bits
+        self.threshold = threshold
+        self.minimum = minimum
+        self.check_disable = check_disable
+        self.multi_disable = multi_disable
+        self.only_self = only_self
+
+        #maximum cause velocity --> minimum acceptable velocity (velocities are ints, i.e. v >= max * threshold <=> v >= ceil(max * threshold))
+        self.acceptable = tuple(math.ceil(max_velocity * threshold) for max_velocity in range(128))
+
+        #whether the policy may block any message or modify DISABLED (e.g. not with --plugins-only)
+        self.can_block = minimum > 0 or check_disable or not multi_disable or (cause_bits != 0 and threshold > 0)
+
+    def __repr__(self):
+        fields = ', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__ if name not in ('acceptable', 'can_block'))
+        return f'Policy({fields})'
 
 class FilterPolicy():
     """ A policy that defines how to filter MIDI events for cross-talk cancellation.
@@ -121,17 +225,23 @@ class FilterPolicy():
 
     def __init__(self, path=None):
         self.policies = {} #midi note --> list of policies for that note
+        self._max_cache = {} #cause bitset --> (HISTORY epoch, maximum cause velocity at that epoch)
+
+        #command-line fallbacks for policies without a valid threshold or minimum
+        self._default_threshold = int(ARGS.threshold)/100
+        self._default_minimum = int(ARGS.minimum)
 
         if path:
             if os.path.isfile(path):
                 with open(path, encoding="utf-8") as fp:
                     self.add_policies(json.load(fp))
             else: #directory
+                #NOTE: os.scandir() returns the entries in arbitrary order, but policies are meant to be loaded in alphabetical order.
                 with os.scandir(path) as it:
-                    for entry in it:
-                        if entry.name.endswith('.json') and entry.is_file():
-                            with open(entry, encoding="utf-8") as fp:
-                                self.add_policies(json.load(fp))
+                    entries = sorted((entry for entry in it if entry.name.endswith('.json') and entry.is_file()), key=lambda entry: entry.name)
+                for entry in entries:
+                    with open(entry, encoding="utf-8") as fp:
+                        self.add_policies(json.load(fp))
 
         if self.policies:
             #make sure that the command-line minimum is always enforced (even if some notes already have policies)
@@ -140,34 +250,44 @@ class FilterPolicy():
             #load default policies
             self.add_policy(json.loads('{ "notes": [], "cause": [], "threshold": -1, "minimum": -1 }'))
 
+        #lookup table for blocks(): midi note --> tuple of policies for that note (policies which cannot block are left out)
+        self._table = tuple(tuple(policy for policy in self.policies.get(note, ()) if policy.can_block) for note in range(128))
+
+        #whether blocks() may block any message at all; if not, there's no need to track the message history
+        self.can_block = any(self._table)
+
     def add_policy(self, policy):
         #set defaults
         notes = policy.get("notes")
         if not notes:
             notes = range(128)
         if policy.get("threshold") is None or policy["threshold"] < 0 or policy["threshold"] > 100:
-            threshold = int(ARGS.threshold)/100
+            threshold = self._default_threshold
         else:
             threshold = int(policy["threshold"])/100
         if policy.get("minimum") is None or policy["minimum"] < 0 or policy["minimum"] > 127:
-            minimum = int(ARGS.minimum)
+            minimum = self._default_minimum
         else:
             minimum = int(policy["minimum"])
-        cause = set(policy.get("cause"))
+        cause = set(policy.get("cause") or ())
+        cause_bits = 0 #cause as bitset (bit i = note i)
+        for c in cause:
+            if not 0 <= c <= 127:
+                raise ValueError(f'Invalid MIDI cause note: {c}')
+            cause_bits |= 1 << c
         if not cause:
+            cause = None #all notes or none as per cause_bits
             if threshold != 0:
-                cause = set(range(128))
-            else:
-                cause = None
+                cause_bits = ALL_NOTES
         check_disable = bool(policy.get("check_disable", False))
         multi_disable = bool(policy.get("multi_disable", True))
         only_self = bool(policy.get("only_self", False))
 
         #add policy
+        policy = Policy(cause, cause_bits, threshold, minimum, check_disable, multi_disable, only_self)
+        policies = self.policies
         for note in notes:
-            if not self.policies.get(note):
-                self.policies[note] = []
-            self.policies[note].append({"cause": cause, "threshold": threshold, "minimum": minimum, "check_disable": check_disable, "multi_disable": multi_disable, "only_self": only_self})
+            policies.setdefault(note, []).append(policy)
 
     def add_policies(self, policies):
         try:
@@ -178,51 +298,42 @@ class FilterPolicy():
 
     def blocks(self, msg):
         """ Check the given MIDI note on message against this policy. Returns None, if the policy allows it, otherwise returns the blocking policy. """
-        #get the policies for that note
-        try:
-            policies = self.policies[msg[1]]
-        except KeyError:
-            #no policy = allow
-            return None
-
-        for policy in policies:
-            if policy.get("multi_disable"):
+        #no policy = allow
+        for policy in self._table[msg[1]]:
+            if policy.multi_disable:
                 disabled = DISABLED.has_similar(msg)
             else:
                 #consume disable notes
                 disabled = DISABLED.pop_similar(msg)
 
             #check whether the message reaches the required minimum velocity
-            if msg[2] < policy.get("minimum", 0):
+            if msg[2] < policy.minimum:
                 return policy
 
             #check whether any disable notes were recently seen
-            if policy.get("check_disable") and disabled:
+            if policy.check_disable and disabled:
                 return policy
 
             #check whether any cross talk notes (messages causing cross-talk as per the policy) were recently seen
-            cross_msgs = HISTORY.get_all(policy["cause"])
-            if not cross_msgs:
+            if not HISTORY.has_any(policy.cause_bits):
                 continue
 
-            #identify the maximum velocity among the messages causing the potential cross-talk (cross_msgs)
-            max_velocity = 0
-            for c in cross_msgs:
-                if c[2] > max_velocity:
-                    max_velocity = c[2]
-
-            if policy.get("only_self"):
-                similar = [msg]
+            #identify the maximum velocity among the recently seen messages causing the potential cross-talk as per the policy
+            #policies often share their cause notes (e.g. all notes)
+            epoch = HISTORY.epoch
+            cached = self._max_cache.get(policy.cause_bits)
+            if cached and cached[0] == epoch:
+                max_velocity = cached[1]
             else:
-                similar = HISTORY.get_similar(msg)
+                max_velocity = HISTORY.get_max_velocity(policy.cause_bits)
+                self._max_cache[policy.cause_bits] = (epoch, max_velocity)
 
             #check whether our message or similar messages with identical notes have an acceptable velocity
-            acceptable_velocity = max_velocity * policy["threshold"]
-            ret = False
-            for s in similar: #includes our message
-                if s[2] >= acceptable_velocity:
-                    ret=True
-            if not ret:
+            acceptable_velocity = policy.acceptable[max_velocity]
+            if policy.only_self:
+                if msg[2] < acceptable_velocity:
+                    return policy
+            elif HISTORY.get_similar_max_velocity(msg) < acceptable_velocity: #includes our message
                 return policy
 
         return None
@@ -245,13 +356,9 @@ def load_plugin(plugin, cls=XtalkPlugin):
     except FileNotFoundError as e:
         raise PluginLoadFailedException('Could not load the plugin %s from the file %s. Does it not exist?' % (plugin, plugin_file)) from e
 
-    ret = None
     cls_name = '_'.join([cls.__name__, plugin])
-    for _, member in inspect.getmembers(module, inspect.isclass):
-        if member.__name__ == cls_name and issubclass(member, cls):
-            ret = member
-            break
-    if not ret:
+    ret = getattr(module, cls_name, None)
+    if not (inspect.isclass(ret) and issubclass(ret, cls)):
         raise PluginLoadFailedException(f'The plugin {plugin} appears to be incorrectly implemented. No matching class {cls_name} found.')
     return ret
 
@@ -282,6 +389,7 @@ def parse_args():
     parser.add_argument('--plugins-config', default=PLUGIN_CONF_FILE_DEFAULT, help='Configuration file to use for plugins. (default: %(default)s)')
     parser.add_argument('--plugins-only', action='store_true', help='Short for --threshold 0 --delay 0 --history 0 --minimum 0. Essentially disables cross-talk cancellation and only runs loaded plugins.')
     parser.add_argument('--list', action='store_true', help='Just list the available APIs and their MIDI ports.')
+    parser.add_argument('--coalesce', default=0, type=int, help='Coalesce (ms): Merge polyphonic aftertouch messages into a not yet processed aftertouch message for the same note, if it came in less than [coalesce] milliseconds ago. Only the latest pressure value is kept. Can reduce the load caused by dense aftertouch streams. 0 disables merging. (default: %(default)s)')
     parser.add_argument('--debug', action='store_true', help='Print debug output.')
     args = parser.parse_args()
 
@@ -295,6 +403,8 @@ def parse_args():
         raise ValueError('Delay is out of range.')
     if args.history < 0:
         raise ValueError('History is out of range.')
+    if args.coalesce < 0:
+        raise ValueError('Coalesce is out of range.')
     if args.threshold < 0 or args.threshold > 100:
         raise ValueError('Threshold is out of range.')
     if args.minimum < 0 or args.minimum > 128:
@@ -309,14 +419,36 @@ def parse_args():
 
     return args
 
-def is_note_disable(msg):
-    if ARGS.dtypes == 'none':
-        return False
-    if ARGS.dtypes == 'note_off':
-        return is_note_off(msg)
-    if ARGS.dtypes == 'aftertouch':
-        return is_note_aftertouch(msg)
-    return is_note_mod(msg)
+def is_note_none(msg):
+    return False
+
+#--dtypes --> function to identify MIDI disable notes
+NOTE_DISABLE_FUNCS = { 'none': is_note_none, 'note_off': is_note_off, 'aftertouch': is_note_aftertouch, 'any': is_note_mod }
+
+#message kind flags, see message_kind()
+KIND_NOTE_ON = 0x1 #note on with velocity > 0
+KIND_DISABLE = 0x2 #disable note as per the --dtypes argument
+KIND_NOTE_MOD = 0x4 #note off, aftertouch or note on with velocity 0
+KIND_AFTERTOUCH = 0x8 #polyphonic aftertouch
+
+def build_kinds(is_note_disable):
+    ''' Build the status byte --> KIND_* flags table used by message_kind(). '''
+    kinds = []
+    for status in range(256):
+        msg = [status, 0, 1] #non-zero velocity, see message_kind()
+        kinds.append((KIND_NOTE_ON if is_note_on(msg) else 0) |
+                     (KIND_DISABLE if is_note_disable(msg) else 0) |
+                     (KIND_NOTE_MOD if is_note_mod(msg) else 0) |
+                     (KIND_AFTERTOUCH if is_note_aftertouch(msg) else 0))
+    return tuple(kinds)
+
+def message_kind(msg):
+    ''' Classify the given MIDI message with a single table lookup. Returns its KIND_* flags. '''
+    status = msg[0]
+    #according to the MIDI standard, note on with 0 velocity is a note off
+    if status & 0xf0 == MIDI_NOTEON and msg[2] == 0:
+        status ^= MIDI_NOTEON ^ MIDI_NOTEOFF
+    return KINDS[status]
 
 def read_callback(tup, data=None):
     if LOOP is None:
@@ -324,69 +456,133 @@ def read_callback(tup, data=None):
     #NOTE: we're running in the thread of the caller (no asyncio loop here)
     #https://raspberrypi.stackexchange.com/questions/54514/implement-a-gpio-function-with-a-callback-calling-a-asyncio-method
     if tup:
-        LOOP.call_soon_threadsafe(asyncio.create_task, read_in(tup))
+        LOOP.call_soon_threadsafe(read_in, tup)
 
-async def read_in(tup):
-    await QUEUE.put(tup)
+def read_in(tup):
     msg = tup[0]
-    if is_note_on(msg):
+    kind = message_kind(msg)
+    if kind & KIND_AFTERTOUCH and ARGS.coalesce and coalesce(msg):
+        return
+    QUEUE.append(tup)
+    QUEUE_EVENT.set()
+    if not POLICY.can_block:
+        return
+    if kind & KIND_NOTE_ON:
         HISTORY.add(msg)
-        debug(f'note on: {msg}')
-    elif is_note_disable(msg):
+        debug('note on: %s', msg)
+    elif kind & KIND_DISABLE:
         #track disable notes for check_disable policy
         DISABLED.add(msg)
-        debug(f'note disable: {msg}')
-    await asyncio.sleep(0)
-
-def cleanup_note_on(msg):
-    try:
-        HISTORY.remove(msg)
-    except ValueError:
-        pass
-
-def cleanup_disabled(msg):
-    try:
-        DISABLED.remove(msg)
-    except ValueError:
-        pass
-
-def debug(print_msg):
+        debug('note disable: %s', msg)
+
+def coalesce(msg):
+    ''' Merge the given aftertouch message into a pending one for the same channel and note, if that one came in less than --coalesce ms ago.
+    Returns whether the message was merged. Otherwise it is remembered for merges of upcoming messages. '''
+    key = (msg[0] << 8) | msg[1]
+    now = time.monotonic()
+    queued = COALESCE.get(key)
+    if queued and (now - queued[1]) * 1000 < ARGS.coalesce:
+        queued[0][2] = msg[2] #the latest pressure value wins
+        return True
+    COALESCE[key] = (msg, now)
+    return False
+
+def schedule_cleanup(loop, delay, history, msg):
+    ''' Schedule the removal of the given message from the given MessageHistory after delay seconds. '''
+    #NOTE: All cleanups use the same delay, i.e. EXPIRY is sorted by time and a single timer for its first entry suffices.
+    when = loop.time() + delay
+    EXPIRY.append((when, history, msg))
+    if len(EXPIRY) == 1:
+        loop.call_at(when, cleanup, loop)
+
+def cleanup(loop):
+    now = loop.time()
+    while EXPIRY and EXPIRY[0][0] <= now:
+        _, history, msg = EXPIRY.popleft()
+        history.remove(msg)
+    if EXPIRY:
+        loop.call_at(EXPIRY[0][0], cleanup, loop)
+
+#print_msg may contain %-style placeholders for the args, which are only formatted in debug mode
+def debug(print_msg, *args):
     if ARGS.debug:
-        now = time.time_ns()/1000000 #ms since epoch
+        now = time.monotonic_ns()/1000000 #ms on the monotonic clock (comparable between xtalk and its plugins)
+        if args:
+            print_msg = print_msg % args
         print(f'DEBUG ({now}): {print_msg}', flush=True)
 
+async def process_many_async(plugin, msgs):
+    ''' XtalkPlugin.process_many() equivalent for plugins implementing process() as async generator. '''
+    out = []
+    process = plugin.process
+    for msg in msgs:
+        async for m in process(msg):
+            out.append(m)
+    return out
+
 async def write_out(midiout):
     cache = []
     delay = ARGS.delay / 1000
     history = ARGS.history / 1000
+    before = ARGS.before
+    blocks = POLICY.blocks
+    can_block = POLICY.can_block
+    loop = asyncio.get_running_loop()
+    send_message = midiout.send_message #rtmidi has no bulk send
+
+    #plugins may implement process() as async or regular generator
+    #bind the function processing a list of messages for every plugin once
+    plugins = []
+    for plugin in PLUGINS:
+        if inspect.isasyncgenfunction(plugin.process):
+            plugins.append((plugin, functools.partial(process_many_async, plugin), True))
+        else:
+            plugins.append((plugin, plugin.process_many, False))
 
     while True:
-        msg, delta = await QUEUE.get()
+        #drain already queued messages without awaiting
+        #NOTE: read_in() runs in the event loop thread, i.e. there are no races with it.
+        if not QUEUE:
+            QUEUE_EVENT.clear()
+            await QUEUE_EVENT.wait()
+        msg, delta = QUEUE.popleft()
         bpolicy = None
         send = True
 
         #wait for further messages to come in
-        await asyncio.sleep(min(delta, delay))
+        #NOTE: Without delay (e.g. --plugins-only) there's nothing to wait for, i.e. queued messages are processed back to back.
+        if delay:
+            await asyncio.sleep(min(delta, delay))
 
-        #debug(f'checking: {msg}')
+        #debug('checking: %s', msg)
+
+        kind = message_kind(msg)
+        if kind & KIND_AFTERTOUCH and COALESCE:
+            #no further merges from here on (the message may be passed to plugins or sent)
+            key = (msg[0] << 8) | msg[1]
+            queued = COALESCE.get(key)
+            if queued and queued[0] is msg:
+                del COALESCE[key]
 
         msgs = [] #messages to handle during this iteration
 
-        if is_note_disable(msg):
-            #schedule cleanup
-            asyncio.get_running_loop().call_later(history, cleanup_disabled, msg)
-        elif is_note_on(msg):
+        #NOTE: disable notes are always note mod messages, i.e. they are never cached
+        if can_block and kind & KIND_DISABLE:
             #schedule cleanup
-            asyncio.get_running_loop().call_later(history, cleanup_note_on, msg)
+            schedule_cleanup(loop, history, DISABLED, msg)
+        elif kind & KIND_NOTE_ON:
+            if can_block:
+                #schedule cleanup
+                schedule_cleanup(loop, history, HISTORY, msg)
 
-            #check cross-talk cancellation policy
-            bpolicy = POLICY.blocks(msg)
-            send = bpolicy is None
+                #check cross-talk cancellation policy
+                bpolicy = blocks(msg)
+                send = bpolicy is None
 
             #use & clear cache
             msgs = cache
             cache = []
-        elif ARGS.before and not is_note_mod(msg):
+        elif before and not kind & KIND_NOTE_MOD:
             #cache until next NOTE_ON message
             cache.append(msg)
             continue
@@ -394,25 +590,24 @@ async def write_out(midiout):
         #decide
         msgs.append(msg)
         if send:
-            debug(f'passed: {msgs}')
+            debug('passed: %s', msgs)
         else:
-            debug(f'SUPPRESSED: {msgs}, policy: {bpolicy}')
+            debug('SUPPRESSED: %s, policy: %s', msgs, bpolicy)
             msgs = []
 
         #plugins may modify messages --> better create a copy or our own memory references may change
         if PLUGINS:
-            pmsgs = copy.deepcopy(msgs)
+            pmsgs = [msg[:] for msg in msgs] #messages are flat lists of ints
         else:
             pmsgs = msgs
 
         #run plugins
-        for plugin in PLUGINS:
+        for plugin, process_many, is_async in plugins:
             try:
-                omsgs = []
-                for msg in pmsgs:
-                    async for m in plugin.process(msg):
-                        omsgs.append(m)
-                pmsgs = omsgs
+                out = process_many(pmsgs)
+                if is_async:
+                    out = await out
+                pmsgs = out
             except XtalkPluginAbortException as e:
                 #stop processing further messages
                 raise PluginAbortException(f'The {plugin} plugin raised an abort exception.') from e
@@ -421,13 +616,15 @@ async def write_out(midiout):
                 print(f'The {plugin} plugin raised an exception: {e}')
 
         #send
-        #debug(f'sending: {pmsgs}')
+        #debug('sending: %s', pmsgs)
         for msg in pmsgs:
-            midiout.send_message(msg)
+            send_message(msg)
 
 async def run():
     global QUEUE
-    QUEUE = asyncio.Queue()
+    global QUEUE_EVENT
+    QUEUE = deque()
+    QUEUE_EVENT = asyncio.Event()
     midiin = None
     midiout = None
 
@@ -458,7 +655,9 @@ def main():
     global ARGS
     global POLICY
     global LOOP
+    global KINDS
     ARGS = parse_args()
+    KINDS = build_kinds(NOTE_DISABLE_FUNCS[ARGS.dtypes])
     POLICY = FilterPolicy(ARGS.policy)
     debug(POLICY)
 
@@ -482,6 +681,7 @@ def main():
         plugin_cls = plugin_classes.get(plugin)
         if not plugin_cls:
             plugin_cls = load_plugin(plugin)
+            plugin_classes[plugin] = plugin_cls
 
         #get plugin configuration
         #try index first (useful if the same plugin is used multiple times), plugin name second